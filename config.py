@@ -55,6 +55,7 @@ VLLM_TIMEOUT = int(os.getenv('VLLM_TIMEOUT', '30'))
 VLLM_MAX_RETRIES = int(os.getenv('VLLM_MAX_RETRIES', '3'))
 VLLM_MAX_TOKENS = int(os.getenv('VLLM_MAX_TOKENS', '512'))
 VLLM_TEMPERATURE = float(os.getenv('VLLM_TEMPERATURE', '0.1'))
+VLLM_STREAM = os.getenv('VLLM_STREAM', 'true').lower() == 'true'
 
 # AI Extraction Configuration
 AI_USE_FALLBACK = os.getenv('AI_USE_FALLBACK', 'true').lower() == 'true'
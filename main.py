@@ -108,7 +108,8 @@ def main():
                     timeout=config.VLLM_TIMEOUT,
                     max_retries=config.VLLM_MAX_RETRIES,
                     max_tokens=config.VLLM_MAX_TOKENS,
-                    temperature=config.VLLM_TEMPERATURE
+                    temperature=config.VLLM_TEMPERATURE,
+                    stream=config.VLLM_STREAM
                 )
 
                 # Check server health
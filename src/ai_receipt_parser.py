@@ -6,13 +6,25 @@ with fallback to regex patterns for robustness.
 """
 import re
 import json
-from typing import Dict, Optional, Any, List
+from collections import OrderedDict
+from types import MappingProxyType
+from typing import Dict, Optional, Any, List, Mapping, Tuple, Union
 from datetime import datetime
 import dateparser
 
+try:
+    import orjson
+except ImportError:  # Optional fast JSON encoder
+    orjson = None
+
 from src.vllm_client import VLLMClient, VLLMClientError, VLLMResponse
 
 
+def _compile_patterns(*patterns: str) -> Tuple[re.Pattern, ...]:
+    """Compile case-insensitive fallback patterns"""
+    return tuple(re.compile(pattern, re.IGNORECASE) for pattern in patterns)
+
+
 class AIReceiptParser:
     """
     AI-powered receipt parser using vLLM for intelligent field extraction.
@@ -27,7 +39,10 @@ class AIReceiptParser:
     - Tax information
     """
 
-    # Enhanced system prompt for insurance claims and medical receipts
+    # Enhanced system prompt for insurance claims and medical receipts.
+    # The system prompt and the template text before {text} form a prefix shared
+    # by every request, which vLLM's prefix cache reuses; keep them free of
+    # per-request values.
     SYSTEM_PROMPT = """You are an expert at extracting structured data from insurance claims, medical invoices, and healthcare receipts.
 
 EXPERTISE AREAS:
@@ -105,6 +120,62 @@ VALIDATION RULES:
 - If a field is not found, use null
 - event_date should typically be earlier than or equal to submission_date"""
 
+    # Generation settings shared by the sync, async and batch extraction paths
+    GENERATION_KWARGS: Mapping[str, Any] = MappingProxyType({
+        'system_prompt': SYSTEM_PROMPT,
+        'temperature': 0.1,  # Low temperature for deterministic output
+        'max_tokens': 512,
+    })
+
+    # Fallback regex patterns (similar to ReceiptParser), compiled once at import
+    DATE_PATTERNS = _compile_patterns(
+        r'\d{1,2}[/-]\d{1,2}[/-]\d{2,4}',  # MM/DD/YYYY or DD/MM/YYYY
+        r'\d{4}[/-]\d{1,2}[/-]\d{1,2}',    # YYYY/MM/DD
+        r'[A-Z][a-z]+\s+\d{1,2},?\s+\d{4}',  # Month DD, YYYY
+    )
+
+    AMOUNT_PATTERNS = _compile_patterns(
+        r'Total[:\s]+[\$£€]?\s*(\d{1,3}(?:,\d{3})*(?:\.\d{2})?)',
+        r'Amount[:\s]+[\$£€]?\s*(\d{1,3}(?:,\d{3})*(?:\.\d{2})?)',
+        r'[\$£€]\s*(\d{1,3}(?:,\d{3})*(?:\.\d{2})?)',
+    )
+
+    INVOICE_PATTERNS = _compile_patterns(
+        r'Invoice\s*#?\s*:?\s*([A-Z0-9-]+)',
+        r'Claim\s*#?\s*:?\s*([A-Z0-9-]+)',
+        r'Bill\s*#?\s*:?\s*([A-Z0-9-]+)',
+        r'Receipt\s*#?\s*:?\s*([A-Z0-9-]+)',
+        r'Reference\s*#?\s*:?\s*([A-Z0-9-]+)',
+        r'Invoice\s+No\.?\s*:?\s*([A-Z0-9-]+)',
+    )
+
+    POLICY_PATTERNS = _compile_patterns(
+        r'Policy\s*#?\s*:?\s*([A-Z0-9-]+)',
+        r'Policy\s+Number\s*:?\s*([A-Z0-9-]+)',
+        r'Member\s+ID\s*:?\s*([A-Z0-9-]+)',
+        r'Subscriber\s+ID\s*:?\s*([A-Z0-9-]+)',
+        r'Insurance\s*#?\s*:?\s*([A-Z0-9-]+)',
+        r'Account\s*#?\s*:?\s*([A-Z0-9-]+)',
+    )
+
+    # Enhanced date patterns for medical/insurance documents
+    EVENT_DATE_PATTERNS = _compile_patterns(
+        r'Date\s+of\s+Service\s*:?\s*(\d{1,2}[/-]\d{1,2}[/-]\d{2,4})',
+        r'Service\s+Date\s*:?\s*(\d{1,2}[/-]\d{1,2}[/-]\d{2,4})',
+        r'DOS\s*:?\s*(\d{1,2}[/-]\d{1,2}[/-]\d{2,4})',
+        r'Treatment\s+Date\s*:?\s*(\d{1,2}[/-]\d{1,2}[/-]\d{2,4})',
+        r'Visit\s+Date\s*:?\s*(\d{1,2}[/-]\d{1,2}[/-]\d{2,4})',
+    )
+
+    TAX_PATTERNS = _compile_patterns(
+        r'Tax[:\s]+[\$£€]?\s*(\d{1,3}(?:,\d{3})*(?:\.\d{2})?)',
+        r'Sales Tax[:\s]+[\$£€]?\s*(\d{1,3}(?:,\d{3})*(?:\.\d{2})?)',
+        r'VAT[:\s]+[\$£€]?\s*(\d{1,3}(?:,\d{3})*(?:\.\d{2})?)',
+    )
+
+    # Maximum number of results kept by extract_fields_cached
+    CACHE_SIZE = 256
+
     def __init__(self, vllm_client: Optional[VLLMClient] = None, use_fallback: bool = True):
         """
         Initialize AI Receipt Parser.
@@ -113,49 +184,32 @@ VALIDATION RULES:
             vllm_client: VLLMClient instance (will be created if not provided)
             use_fallback: Whether to use regex fallback if AI extraction fails
         """
+        # LRU cache for extract_fields_cached; must exist before the
+        # vllm_client/use_fallback setters below clear it
+        self._cache: "OrderedDict[Tuple[str, Union[str, bytes]], Mapping[str, Any]]" = OrderedDict()
         self.vllm_client = vllm_client
         self.use_fallback = use_fallback
         self._fallback_initialized = False
 
-        # Fallback regex patterns (similar to ReceiptParser)
-        self.date_patterns = [
-            r'\d{1,2}[/-]\d{1,2}[/-]\d{2,4}',  # MM/DD/YYYY or DD/MM/YYYY
-            r'\d{4}[/-]\d{1,2}[/-]\d{1,2}',    # YYYY/MM/DD
-            r'[A-Z][a-z]+\s+\d{1,2},?\s+\d{4}',  # Month DD, YYYY
-        ]
-
-        self.amount_patterns = [
-            r'Total[:\s]+[\$£€]?\s*(\d{1,3}(?:,\d{3})*(?:\.\d{2})?)',
-            r'Amount[:\s]+[\$£€]?\s*(\d{1,3}(?:,\d{3})*(?:\.\d{2})?)',
-            r'[\$£€]\s*(\d{1,3}(?:,\d{3})*(?:\.\d{2})?)',
-        ]
-
-        self.invoice_patterns = [
-            r'Invoice\s*#?\s*:?\s*([A-Z0-9-]+)',
-            r'Claim\s*#?\s*:?\s*([A-Z0-9-]+)',
-            r'Bill\s*#?\s*:?\s*([A-Z0-9-]+)',
-            r'Receipt\s*#?\s*:?\s*([A-Z0-9-]+)',
-            r'Reference\s*#?\s*:?\s*([A-Z0-9-]+)',
-            r'Invoice\s+No\.?\s*:?\s*([A-Z0-9-]+)',
-        ]
-
-        self.policy_patterns = [
-            r'Policy\s*#?\s*:?\s*([A-Z0-9-]+)',
-            r'Policy\s+Number\s*:?\s*([A-Z0-9-]+)',
-            r'Member\s+ID\s*:?\s*([A-Z0-9-]+)',
-            r'Subscriber\s+ID\s*:?\s*([A-Z0-9-]+)',
-            r'Insurance\s*#?\s*:?\s*([A-Z0-9-]+)',
-            r'Account\s*#?\s*:?\s*([A-Z0-9-]+)',
-        ]
-
-        # Enhanced date patterns for medical/insurance documents
-        self.event_date_patterns = [
-            r'Date\s+of\s+Service\s*:?\s*(\d{1,2}[/-]\d{1,2}[/-]\d{2,4})',
-            r'Service\s+Date\s*:?\s*(\d{1,2}[/-]\d{1,2}[/-]\d{2,4})',
-            r'DOS\s*:?\s*(\d{1,2}[/-]\d{1,2}[/-]\d{2,4})',
-            r'Treatment\s+Date\s*:?\s*(\d{1,2}[/-]\d{1,2}[/-]\d{2,4})',
-            r'Visit\s+Date\s*:?\s*(\d{1,2}[/-]\d{1,2}[/-]\d{2,4})',
-        ]
+    @property
+    def vllm_client(self) -> Optional[VLLMClient]:
+        return self._vllm_client
+
+    @vllm_client.setter
+    def vllm_client(self, client: Optional[VLLMClient]):
+        # Cached results depend on the client, so drop them
+        self._vllm_client = client
+        self._cache.clear()
+
+    @property
+    def use_fallback(self) -> bool:
+        return self._use_fallback
+
+    @use_fallback.setter
+    def use_fallback(self, use_fallback: bool):
+        # Cached results depend on whether the regex fallback ran, so drop them
+        self._use_fallback = use_fallback
+        self._cache.clear()
 
     def set_vllm_client(self, client: VLLMClient):
         """Set or update the vLLM client"""
@@ -172,7 +226,131 @@ VALIDATION RULES:
         Returns:
             Dictionary with extracted fields and confidence scores
         """
-        result = {
+        result = self._empty_result(text)
+
+        if not text or not text.strip():
+            return result
+
+        # Try AI extraction first
+        ai_result = None
+        if self.vllm_client:
+            try:
+                ai_result = self._extract_with_ai(text)
+            except VLLMClientError as e:
+                print(f"AI extraction failed: {e}")
+
+        return self._merge_results(result, text, email_data, ai_result)
+
+    async def aextract_fields(self, text: str, email_data: Optional[Dict] = None) -> Dict[str, Any]:
+        """
+        Async variant of extract_fields.
+
+        Awaits the vLLM request instead of blocking, so many receipts can be
+        in flight at once (e.g. with asyncio.gather) and share the server's
+        continuous batch.
+
+        Args:
+            text: Receipt text to parse
+            email_data: Optional email metadata for additional context
+
+        Returns:
+            Dictionary with extracted fields and confidence scores
+        """
+        result = self._empty_result(text)
+
+        if not text or not text.strip():
+            return result
+
+        # Try AI extraction first
+        ai_result = None
+        if self.vllm_client:
+            try:
+                response: VLLMResponse = await self.vllm_client.generate_async(
+                    prompt=self._build_extraction_prompt(text),
+                    **self.GENERATION_KWARGS
+                )
+                ai_result = self._parse_ai_response(response)
+            except VLLMClientError as e:
+                print(f"AI extraction failed: {e}")
+
+        return self._merge_results(result, text, email_data, ai_result)
+
+    def extract_batch(
+        self,
+        texts: List[str],
+        email_data: Optional[Dict] = None,
+        n_bins: int = 4,
+    ) -> List[Dict[str, Any]]:
+        """
+        Extract receipt fields from several receipts with batched vLLM requests.
+
+        Receipts are grouped into bins of similar length and each bin is sent
+        as one request, so short receipts are not held back waiting on the
+        longest one in the batch. Receipts whose AI extraction fails fall back
+        to regex individually.
+
+        Args:
+            texts: Receipt texts to parse
+            email_data: Optional email metadata applied to every receipt
+            n_bins: Maximum number of length bins (1 sends a single request)
+
+        Returns:
+            List of extraction results, in the same order as texts
+        """
+        results = [self._empty_result(text) for text in texts]
+        pending = [i for i, text in enumerate(texts) if text and text.strip()]
+        ai_results: Dict[int, Dict[str, Any]] = {}
+
+        if self.vllm_client and pending:
+            for bin_indices in self._bin([texts[i] for i in pending], n_bins):
+                indices = [pending[j] for j in bin_indices]
+                try:
+                    responses = self.vllm_client.generate_batch(
+                        prompts=[self._build_extraction_prompt(texts[i]) for i in indices],
+                        **self.GENERATION_KWARGS
+                    )
+                except VLLMClientError as e:
+                    print(f"AI batch extraction failed: {e}")
+                    continue
+
+                for i, response in zip(indices, responses):
+                    try:
+                        ai_results[i] = self._parse_ai_response(response)
+                    except VLLMClientError as e:
+                        print(f"AI extraction failed: {e}")
+
+        for i in pending:
+            results[i] = self._merge_results(results[i], texts[i], email_data, ai_results.get(i))
+
+        return results
+
+    @staticmethod
+    def _bin(texts: List[str], n_bins: int = 4) -> List[List[int]]:
+        """
+        Partition texts into bins of similar length.
+
+        Args:
+            texts: Texts to partition
+            n_bins: Maximum number of bins
+
+        Returns:
+            Lists of indices into texts, shortest texts first
+        """
+        order = sorted(range(len(texts)), key=lambda i: len(texts[i]))
+        n_bins = max(1, min(n_bins, len(order)))
+        size, extra = divmod(len(order), n_bins)
+
+        bins = []
+        start = 0
+        for b in range(n_bins):
+            end = start + size + (1 if b < extra else 0)
+            bins.append(order[start:end])
+            start = end
+        return [b for b in bins if b]
+
+    def _empty_result(self, text: str) -> Dict[str, Any]:
+        """Build the default result returned when nothing is extracted"""
+        return {
             'event_date': None,
             'submission_date': None,
             'claim_amount': None,
@@ -185,28 +363,38 @@ VALIDATION RULES:
             'raw_text': text[:500] if text else '',
         }
 
-        if not text or not text.strip():
-            return result
+    def _merge_results(
+        self,
+        result: Dict[str, Any],
+        text: str,
+        email_data: Optional[Dict],
+        ai_result: Optional[Dict[str, Any]],
+    ) -> Dict[str, Any]:
+        """
+        Merge AI results into the base result, then fill gaps with regex.
 
-        # Try AI extraction first
-        if self.vllm_client:
-            try:
-                ai_result = self._extract_with_ai(text)
-                if ai_result and ai_result.get('confidence', 0) > 0.5:
-                    # Merge AI results
-                    for key in ['event_date', 'submission_date', 'claim_amount',
-                                'invoice_number', 'policy_number', 'vendor', 'tax']:
-                        if ai_result.get(key) is not None:
-                            result[key] = ai_result[key]
-
-                    result['extraction_method'] = 'ai'
-                    result['confidence'] = ai_result.get('confidence', 0.8)
-
-                    # If AI extraction successful, return
-                    if self._has_meaningful_data(result):
-                        return result
-            except VLLMClientError as e:
-                print(f"AI extraction failed: {e}")
+        Args:
+            result: Base result from _empty_result
+            text: Receipt text
+            email_data: Optional email metadata
+            ai_result: Cleaned AI extraction, or None if AI was unavailable
+
+        Returns:
+            Merged result dictionary
+        """
+        if ai_result and ai_result.get('confidence', 0) > 0.5:
+            # Merge AI results
+            for key in ['event_date', 'submission_date', 'claim_amount',
+                        'invoice_number', 'policy_number', 'vendor', 'tax']:
+                if ai_result.get(key) is not None:
+                    result[key] = ai_result[key]
+
+            result['extraction_method'] = 'ai'
+            result['confidence'] = ai_result.get('confidence', 0.8)
+
+            # If AI extraction successful, return
+            if self._has_meaningful_data(result):
+                return result
 
         # Fallback to regex extraction
         if self.use_fallback:
@@ -227,6 +415,47 @@ VALIDATION RULES:
 
         return result
 
+    def extract_fields_cached(self, text: str, email_data: Optional[Dict] = None) -> Mapping[str, Any]:
+        """
+        Memoized variant of extract_fields for repeated inputs.
+
+        Results are cached per parser instance, keyed on the text and email
+        metadata, and returned as read-only mappings so cached entries cannot
+        be mutated by callers.
+
+        Args:
+            text: Receipt text to parse
+            email_data: Optional email metadata for additional context
+
+        Returns:
+            Read-only mapping with extracted fields and confidence scores
+        """
+        try:
+            key = (text, self._email_key(email_data))
+        except TypeError:
+            # Metadata that can't be serialized into a key is parsed uncached
+            return MappingProxyType(self.extract_fields(text, email_data))
+
+        cached = self._cache.get(key)
+        if cached is not None:
+            self._cache.move_to_end(key)
+            return cached
+
+        result = MappingProxyType(self.extract_fields(text, email_data))
+        self._cache[key] = result
+        if len(self._cache) > self.CACHE_SIZE:
+            self._cache.popitem(last=False)
+        return result
+
+    @staticmethod
+    def _email_key(email_data: Optional[Dict]) -> Union[str, bytes]:
+        """Canonical, hashable form of email metadata (raises TypeError if unserializable)"""
+        if not email_data:
+            return b""
+        if orjson is not None:
+            return orjson.dumps(email_data, option=orjson.OPT_SORT_KEYS)
+        return json.dumps(email_data, sort_keys=True)
+
     def _extract_with_ai(self, text: str) -> Dict[str, Any]:
         """
         Extract fields using AI/LLM.
@@ -240,23 +469,35 @@ VALIDATION RULES:
         if not self.vllm_client:
             raise VLLMClientError("vLLM client not initialized")
 
-        # Truncate text if too long (to fit in context window)
+        # Generate with AI
+        response: VLLMResponse = self.vllm_client.generate(
+            prompt=self._build_extraction_prompt(text),
+            **self.GENERATION_KWARGS
+        )
+
+        return self._parse_ai_response(response)
+
+    def _build_extraction_prompt(self, text: str) -> str:
+        """Build the user prompt for a receipt, truncated to fit the context window"""
         max_text_length = 2000
         if len(text) > max_text_length:
             text = text[:max_text_length] + "..."
 
-        # Build prompt
-        prompt = self.EXTRACTION_PROMPT_TEMPLATE.format(text=text)
+        return self.EXTRACTION_PROMPT_TEMPLATE.format(text=text)
 
-        # Generate with AI
-        response: VLLMResponse = self.vllm_client.generate(
-            prompt=prompt,
-            system_prompt=self.SYSTEM_PROMPT,
-            temperature=0.1,  # Low temperature for deterministic output
-            max_tokens=512
-        )
+    def _parse_ai_response(self, response: VLLMResponse) -> Dict[str, Any]:
+        """
+        Parse and validate the JSON fields from a vLLM response.
 
-        # Parse JSON from response
+        Args:
+            response: Response returned by the vLLM client
+
+        Returns:
+            Dictionary with extracted fields and confidence
+
+        Raises:
+            VLLMClientError: If no JSON could be parsed from the response
+        """
         extracted_data = self.vllm_client.extract_json_from_response(response.text)
 
         if not extracted_data:
@@ -356,8 +597,8 @@ VALIDATION RULES:
     # Fallback regex extraction methods
     def _extract_date_regex(self, text: str, email_data: Optional[Dict] = None) -> Optional[str]:
         """Extract date using regex"""
-        for pattern in self.date_patterns:
-            match = re.search(pattern, text, re.IGNORECASE)
+        for pattern in self.DATE_PATTERNS:
+            match = pattern.search(text)
             if match:
                 date_str = match.group(0)
                 parsed_date = self._parse_date(date_str)
@@ -373,8 +614,8 @@ VALIDATION RULES:
     def _extract_amount_regex(self, text: str) -> Optional[float]:
         """Extract amount using regex"""
         amounts = []
-        for pattern in self.amount_patterns:
-            matches = re.finditer(pattern, text, re.IGNORECASE)
+        for pattern in self.AMOUNT_PATTERNS:
+            matches = pattern.finditer(text)
             for match in matches:
                 amount_str = match.group(1).replace(',', '')
                 try:
@@ -386,16 +627,16 @@ VALIDATION RULES:
 
     def _extract_invoice_regex(self, text: str) -> Optional[str]:
         """Extract invoice number using regex"""
-        for pattern in self.invoice_patterns:
-            match = re.search(pattern, text, re.IGNORECASE)
+        for pattern in self.INVOICE_PATTERNS:
+            match = pattern.search(text)
             if match:
                 return match.group(1).strip()[:50]
         return None
 
     def _extract_policy_regex(self, text: str) -> Optional[str]:
         """Extract policy number using regex"""
-        for pattern in self.policy_patterns:
-            match = re.search(pattern, text, re.IGNORECASE)
+        for pattern in self.POLICY_PATTERNS:
+            match = pattern.search(text)
             if match:
                 return match.group(1).strip()[:50]
         return None
@@ -427,14 +668,8 @@ VALIDATION RULES:
 
     def _extract_tax_regex(self, text: str) -> Optional[float]:
         """Extract tax amount using regex"""
-        tax_patterns = [
-            r'Tax[:\s]+[\$£€]?\s*(\d{1,3}(?:,\d{3})*(?:\.\d{2})?)',
-            r'Sales Tax[:\s]+[\$£€]?\s*(\d{1,3}(?:,\d{3})*(?:\.\d{2})?)',
-            r'VAT[:\s]+[\$£€]?\s*(\d{1,3}(?:,\d{3})*(?:\.\d{2})?)',
-        ]
-
-        for pattern in tax_patterns:
-            match = re.search(pattern, text, re.IGNORECASE)
+        for pattern in self.TAX_PATTERNS:
+            match = pattern.search(text)
             if match:
                 amount_str = match.group(1).replace(',', '')
                 try:
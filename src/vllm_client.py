@@ -8,7 +8,20 @@ from typing import Dict, List, Optional, Any, Union
 from dataclasses import dataclass
 import aiohttp
 import requests
-from tenacity import retry, stop_after_attempt, wait_exponential, retry_if_exception_type
+from requests.adapters import HTTPAdapter
+from tenacity import (
+    Retrying, retry, retry_if_exception, retry_if_exception_type,
+    stop_after_attempt, wait_exponential,
+)
+
+try:
+    import orjson
+except ImportError:  # Optional fast JSON decoder
+    orjson = None
+
+# orjson.JSONDecodeError subclasses json.JSONDecodeError, so callers can
+# catch the stdlib exception either way
+_json_loads = orjson.loads if orjson is not None else json.loads
 
 
 @dataclass
@@ -36,6 +49,95 @@ class VLLMTimeoutError(VLLMClientError):
     pass
 
 
+def _is_transient(exc: BaseException) -> bool:
+    """Whether a synchronous request error is worth retrying"""
+    if isinstance(exc, requests.Timeout):
+        return True
+    if not isinstance(exc, requests.ConnectionError):
+        return False
+    # A refused connection means no server is listening; backing off won't help
+    cause = exc.__cause__ or exc.__context__
+    while cause is not None:
+        if isinstance(cause, ConnectionRefusedError):
+            return False
+        cause = cause.__cause__ or cause.__context__
+    return True
+
+
+class _StreamedCompletion:
+    """
+    Accumulates a streamed (SSE) completion and spots the end of its JSON object.
+
+    Tracks brace depth over the generated text, ignoring braces inside JSON
+    strings, so the caller can stop reading as soon as the extraction object
+    closes instead of waiting for trailing tokens and EOS.
+    """
+
+    def __init__(self):
+        self.parts: List[str] = []
+        self.model: Optional[str] = None
+        self.finish_reason: Optional[str] = None
+        self.complete = False
+        self._depth = 0
+        self._in_string = False
+        self._escaped = False
+
+    def feed_line(self, line: bytes) -> bool:
+        """Consume one SSE line; return True once no more input is needed"""
+        line = line.strip()
+        if not line.startswith(b"data:"):
+            return False
+        data = line[5:].strip()
+        if data == b"[DONE]":
+            return True
+
+        # JSONDecodeError (stdlib or orjson) is a ValueError, which the transport
+        # error mapping in the callers would otherwise let through
+        try:
+            event = _json_loads(data)
+        except ValueError as e:
+            raise VLLMClientError(f"Malformed stream event from vLLM server: {data[:200]!r}") from e
+        if not isinstance(event, dict):
+            raise VLLMClientError(f"Malformed stream event from vLLM server: {data[:200]!r}")
+        self.model = event.get("model", self.model)
+        choices = event.get("choices") or [{}]
+        self.finish_reason = choices[0].get("finish_reason") or self.finish_reason
+        return self._feed_text(choices[0].get("text", ""))
+
+    def _feed_text(self, text: str) -> bool:
+        for i, char in enumerate(text):
+            if self._in_string:
+                if self._escaped:
+                    self._escaped = False
+                elif char == "\\":
+                    self._escaped = True
+                elif char == '"':
+                    self._in_string = False
+            elif char == '"' and self._depth:
+                self._in_string = True
+            elif char == "{":
+                self._depth += 1
+            elif char == "}" and self._depth:
+                self._depth -= 1
+                if not self._depth:
+                    self.parts.append(text[:i + 1])
+                    self.complete = True
+                    return True
+        self.parts.append(text)
+        return False
+
+    def result(self) -> Dict[str, Any]:
+        """Completion result in the shape of a non-streaming response"""
+        # A closed JSON object is as good as a natural stop for extraction
+        finish_reason = "stop" if self.complete else self.finish_reason
+        result = {
+            "choices": [{"index": 0, "text": "".join(self.parts), "finish_reason": finish_reason}],
+        }
+        if self.model:
+            result["model"] = self.model
+        return result
+
+
 class VLLMClient:
     """
     Client for interacting with vLLM server for text generation and extraction.
@@ -45,6 +147,7 @@ class VLLMClient:
     - Connection pooling
     - Timeout handling
     - Response validation
+    - Optional streaming that returns as soon as the JSON object is complete
     """
 
     def __init__(
@@ -55,6 +158,7 @@ class VLLMClient:
         max_retries: int = 3,
         max_tokens: int = 512,
         temperature: float = 0.1,
+        stream: bool = False,
     ):
         """
         Initialize vLLM client.
@@ -66,6 +170,8 @@ class VLLMClient:
             max_retries: Maximum number of retry attempts
             max_tokens: Maximum tokens to generate
             temperature: Sampling temperature (lower = more deterministic)
+            stream: Stream single-prompt completions and stop reading once the
+                generated JSON object closes (batch requests are never streamed)
         """
         self.server_url = server_url.rstrip('/')
         self.model_name = model_name
@@ -73,6 +179,7 @@ class VLLMClient:
         self.max_retries = max_retries
         self.max_tokens = max_tokens
         self.temperature = temperature
+        self.stream = stream
 
         # Endpoints
         self.completions_url = f"{self.server_url}/v1/completions"
@@ -82,6 +189,22 @@ class VLLMClient:
         # Session for connection pooling
         self._session: Optional[aiohttp.ClientSession] = None
 
+        # Keep-alive session for the synchronous methods. requests does not
+        # document Session as thread-safe; sharing it across threads only
+        # works for plain posts that leave cookies and settings untouched
+        self._http = requests.Session()
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=32)
+        self._http.mount("http://", adapter)
+        self._http.mount("https://", adapter)
+
+        # Retry policy for synchronous requests, sized from max_retries
+        self._retrying = Retrying(
+            stop=stop_after_attempt(max(1, max_retries)),
+            wait=wait_exponential(multiplier=1, min=2, max=10),
+            retry=retry_if_exception(_is_transient),
+            reraise=True,
+        )
+
     async def _get_session(self) -> aiohttp.ClientSession:
         """Get or create aiohttp session with connection pooling"""
         if self._session is None or self._session.closed:
@@ -106,6 +229,92 @@ class VLLMClient:
         """Build a formatted prompt for the model"""
         return f"{system_prompt}\n\nUser: {user_prompt}\n\nAssistant:"
 
+    def _build_payload(
+        self,
+        prompt: Union[str, List[str]],
+        system_prompt: Optional[str],
+        temperature: Optional[float],
+        max_tokens: Optional[int],
+    ) -> Dict[str, Any]:
+        """Build a completions request payload for one prompt or a list of prompts"""
+        # Build full prompt(s)
+        if system_prompt:
+            if isinstance(prompt, str):
+                full_prompt = self._build_prompt(system_prompt, prompt)
+            else:
+                full_prompt = [self._build_prompt(system_prompt, p) for p in prompt]
+        else:
+            full_prompt = prompt
+
+        return {
+            "model": self.model_name,
+            "prompt": full_prompt,
+            "max_tokens": max_tokens or self.max_tokens,
+            "temperature": temperature if temperature is not None else self.temperature,
+            "top_p": 0.95,
+            "stop": ["User:", "\n\n\n"],
+        }
+
+    def _parse_choice(self, choice: Dict[str, Any], result: Dict[str, Any]) -> VLLMResponse:
+        """Convert a single completion choice into a VLLMResponse"""
+        generated_text = choice.get("text", "").strip()
+
+        # Calculate confidence (simplified - based on finish reason)
+        finish_reason = choice.get("finish_reason", "")
+        confidence = 0.9 if finish_reason == "stop" else 0.7
+
+        return VLLMResponse(
+            text=generated_text,
+            confidence=confidence,
+            model=result.get("model", self.model_name),
+            usage=result.get("usage", {}),
+            raw_response=result
+        )
+
+    def _parse_batch(self, result: Dict[str, Any], num_prompts: int) -> List[VLLMResponse]:
+        """Convert a batched completion result into responses ordered by prompt index"""
+        choices = sorted(result.get("choices", []), key=lambda c: c.get("index", 0))
+        if len(choices) != num_prompts:
+            raise VLLMClientError(
+                f"Expected {num_prompts} choices in vLLM response, got {len(choices)}"
+            )
+
+        return [self._parse_choice(choice, result) for choice in choices]
+
+    def _post_completions(self, payload: Dict[str, Any]) -> Dict[str, Any]:
+        """POST a completions payload over the pooled keep-alive session"""
+        response = self._http.post(self.completions_url, json=payload, timeout=self.timeout)
+        if response.status_code != 200:
+            raise VLLMConnectionError(
+                f"vLLM server returned status {response.status_code}: {response.text}"
+            )
+        return response.json()
+
+    def _stream_completions(self, payload: Dict[str, Any]) -> Dict[str, Any]:
+        """POST a streaming completions payload and read until the JSON object closes"""
+        completion = _StreamedCompletion()
+        with self._http.post(
+            self.completions_url, json=payload, timeout=self.timeout, stream=True
+        ) as response:
+            if response.status_code != 200:
+                raise VLLMConnectionError(
+                    f"vLLM server returned status {response.status_code}: {response.text}"
+                )
+            for line in response.iter_lines():
+                if completion.feed_line(line):
+                    break
+        return completion.result()
+
+    def _request_completions(self, payload: Dict[str, Any]) -> Dict[str, Any]:
+        """Send a completions request synchronously, mapping transport errors"""
+        try:
+            send = self._stream_completions if payload.get("stream") else self._post_completions
+            return self._retrying(send, payload)
+        except requests.Timeout as e:
+            raise VLLMTimeoutError(f"Request timed out after {self.timeout}s") from e
+        except requests.RequestException as e:
+            raise VLLMConnectionError(f"Failed to connect to vLLM server: {e}") from e
+
     @retry(
         stop=stop_after_attempt(3),
         wait=wait_exponential(multiplier=1, min=2, max=10),
@@ -136,22 +345,8 @@ class VLLMClient:
             VLLMTimeoutError: If request times out
         """
         session = await self._get_session()
-
-        # Build full prompt
-        if system_prompt:
-            full_prompt = self._build_prompt(system_prompt, prompt)
-        else:
-            full_prompt = prompt
-
-        # Build request payload
-        payload = {
-            "model": self.model_name,
-            "prompt": full_prompt,
-            "max_tokens": max_tokens or self.max_tokens,
-            "temperature": temperature if temperature is not None else self.temperature,
-            "top_p": 0.95,
-            "stop": ["User:", "\n\n\n"],
-        }
+        payload = self._build_payload(prompt, system_prompt, temperature, max_tokens)
+        payload["stream"] = self.stream
 
         try:
             async with session.post(self.completions_url, json=payload) as response:
@@ -161,26 +356,80 @@ class VLLMClient:
                         f"vLLM server returned status {response.status}: {error_text}"
                     )
 
-                result = await response.json()
+                if self.stream:
+                    completion = _StreamedCompletion()
+                    async for line in response.content:
+                        if completion.feed_line(line):
+                            break
+                    result = completion.result()
+                else:
+                    result = await response.json()
 
                 # Extract response
                 choices = result.get("choices", [])
                 if not choices:
                     raise VLLMClientError("No choices in vLLM response")
 
-                generated_text = choices[0].get("text", "").strip()
+                return self._parse_choice(choices[0], result)
 
-                # Calculate confidence (simplified - based on finish reason)
-                finish_reason = choices[0].get("finish_reason", "")
-                confidence = 0.9 if finish_reason == "stop" else 0.7
+        except asyncio.TimeoutError as e:
+            raise VLLMTimeoutError(f"Request timed out after {self.timeout}s") from e
+        except aiohttp.ClientError as e:
+            raise VLLMConnectionError(f"Failed to connect to vLLM server: {e}") from e
+        except ValueError as e:
+            # Undecodable response body
+            raise VLLMClientError(f"Malformed response from vLLM server: {e}") from e
 
-                return VLLMResponse(
-                    text=generated_text,
-                    confidence=confidence,
-                    model=result.get("model", self.model_name),
-                    usage=result.get("usage", {}),
-                    raw_response=result
-                )
+    @retry(
+        stop=stop_after_attempt(3),
+        wait=wait_exponential(multiplier=1, min=2, max=10),
+        retry=retry_if_exception_type((aiohttp.ClientError, asyncio.TimeoutError)),
+        reraise=True
+    )
+    async def generate_batch_async(
+        self,
+        prompts: List[str],
+        system_prompt: Optional[str] = None,
+        temperature: Optional[float] = None,
+        max_tokens: Optional[int] = None,
+    ) -> List[VLLMResponse]:
+        """
+        Generate text for several prompts in a single request.
+
+        vLLM's completions endpoint accepts a list of prompts and schedules
+        them together, so the whole batch shares one HTTP round-trip and one
+        continuous batch on the server.
+
+        Args:
+            prompts: The input prompts
+            system_prompt: Optional system instruction applied to every prompt
+            temperature: Override default temperature
+            max_tokens: Override default max tokens
+
+        Returns:
+            List of VLLMResponse, in the same order as prompts
+
+        Raises:
+            VLLMConnectionError: If unable to connect to server
+            VLLMTimeoutError: If request times out
+        """
+        if not prompts:
+            return []
+
+        session = await self._get_session()
+        payload = self._build_payload(prompts, system_prompt, temperature, max_tokens)
+
+        try:
+            async with session.post(self.completions_url, json=payload) as response:
+                if response.status != 200:
+                    error_text = await response.text()
+                    raise VLLMConnectionError(
+                        f"vLLM server returned status {response.status}: {error_text}"
+                    )
+
+                result = await response.json()
+
+                return self._parse_batch(result, len(prompts))
 
         except asyncio.TimeoutError as e:
             raise VLLMTimeoutError(f"Request timed out after {self.timeout}s") from e
@@ -195,7 +444,12 @@ class VLLMClient:
         max_tokens: Optional[int] = None,
     ) -> VLLMResponse:
         """
-        Synchronous wrapper for generate_async.
+        Generate text synchronously using vLLM server.
+
+        Requests go through a pooled keep-alive session, so repeated calls
+        reuse the same connection instead of reconnecting each time. With
+        streaming enabled the call returns as soon as the generated JSON
+        object closes.
 
         Args:
             prompt: The input prompt
@@ -205,16 +459,49 @@ class VLLMClient:
 
         Returns:
             VLLMResponse with generated text and metadata
+
+        Raises:
+            VLLMConnectionError: If unable to connect to server
+            VLLMTimeoutError: If request times out
         """
-        loop = asyncio.new_event_loop()
-        try:
-            return loop.run_until_complete(
-                self.generate_async(prompt, system_prompt, temperature, max_tokens)
-            )
-        finally:
-            # Clean up
-            loop.run_until_complete(self.close())
-            loop.close()
+        payload = self._build_payload(prompt, system_prompt, temperature, max_tokens)
+        payload["stream"] = self.stream
+        result = self._request_completions(payload)
+
+        choices = result.get("choices", [])
+        if not choices:
+            raise VLLMClientError("No choices in vLLM response")
+
+        return self._parse_choice(choices[0], result)
+
+    def generate_batch(
+        self,
+        prompts: List[str],
+        system_prompt: Optional[str] = None,
+        temperature: Optional[float] = None,
+        max_tokens: Optional[int] = None,
+    ) -> List[VLLMResponse]:
+        """
+        Generate text for several prompts in a single synchronous request.
+
+        Args:
+            prompts: The input prompts
+            system_prompt: Optional system instruction applied to every prompt
+            temperature: Override default temperature
+            max_tokens: Override default max tokens
+
+        Returns:
+            List of VLLMResponse, in the same order as prompts
+
+        Raises:
+            VLLMConnectionError: If unable to connect to server
+            VLLMTimeoutError: If request times out
+        """
+        if not prompts:
+            return []
+
+        payload = self._build_payload(prompts, system_prompt, temperature, max_tokens)
+        return self._parse_batch(self._request_completions(payload), len(prompts))
 
     def check_health(self) -> bool:
         """
@@ -224,7 +511,7 @@ class VLLMClient:
             True if server is healthy, False otherwise
         """
         try:
-            response = requests.get(
+            response = self._http.get(
                 f"{self.server_url}/health",
                 timeout=5
             )
@@ -240,7 +527,7 @@ class VLLMClient:
             List of model names
         """
         try:
-            response = requests.get(self.models_url, timeout=10)
+            response = self._http.get(self.models_url, timeout=10)
             if response.status_code == 200:
                 data = response.json()
                 return [model.get("id") for model in data.get("data", [])]
@@ -266,13 +553,13 @@ class VLLMClient:
 
         for match in matches:
             try:
-                return json.loads(match)
+                return _json_loads(match)
             except json.JSONDecodeError:
                 continue
 
         # Try parsing the whole response
         try:
-            return json.loads(response_text)
+            return _json_loads(response_text)
         except json.JSONDecodeError:
             return None
 
@@ -282,6 +569,7 @@ class VLLMClient:
 
     def __exit__(self, exc_type, exc_val, exc_tb):
         """Cleanup on context exit"""
+        self._http.close()
         loop = asyncio.new_event_loop()
         try:
             loop.run_until_complete(self.close())
@@ -3,9 +3,13 @@ Pytest Configuration and Shared Fixtures
 Provides common test fixtures, mocks, and utilities
 """
 import pytest
+import functools
 import json
 import os
-from unittest.mock import Mock, MagicMock, patch
+import orjson
+import requests
+from pathlib import Path
+from unittest.mock import AsyncMock, Mock, MagicMock, patch
 from typing import Dict, Any, List
 
 
@@ -13,22 +17,66 @@ from typing import Dict, Any, List
 # Test Configuration
 # ============================================================================
 
+_FIXTURES_DIR = Path(__file__).parent / "fixtures"
+
+VLLM_TEST_URL = os.getenv("VLLM_SERVER_URL", "http://localhost:8000")
+
+# Quantization the live server was launched with (vllm serve --quantization);
+# fp8 on Hopper/Ada GPUs, awq/gptq checkpoints elsewhere, "none" for full precision
+VLLM_TEST_QUANTIZATION = os.getenv("VLLM_QUANTIZATION", "fp8")
+
+
+@functools.lru_cache(maxsize=1)
+def _vllm_available() -> bool:
+    """Probe the vLLM server once per session"""
+    try:
+        return requests.get(f"{VLLM_TEST_URL}/health", timeout=0.5).status_code == 200
+    except requests.RequestException:
+        return False
+
+
+@pytest.fixture(autouse=True)
+def _gate_e2e(request):
+    """Skip end-to-end tests up front when no vLLM server is reachable"""
+    if "e2e" in request.node.keywords and not _vllm_available():
+        pytest.skip(f"vLLM server not reachable at {VLLM_TEST_URL}")
+
+
 @pytest.fixture(scope="session")
 def test_config():
     """Provide test configuration"""
     return {
-        "vllm_url": "http://localhost:8000",
+        "vllm_url": VLLM_TEST_URL,
         "vllm_model": "meta-llama/Llama-3.2-3B-Instruct",
+        "quantization": VLLM_TEST_QUANTIZATION,
         "max_retries": 3,
         "timeout": 30,
         "confidence_threshold": 0.7,
     }
 
 
+@pytest.fixture(scope="class")
+def pinned_cpu():
+    """Pin the test process to one core (one per xdist worker) for one test class's timings"""
+    if not hasattr(os, "sched_setaffinity"):
+        yield None
+        return
+
+    original = os.sched_getaffinity(0)
+    cores = sorted(original)
+    worker = os.getenv("PYTEST_XDIST_WORKER", "gw0")
+    core = cores[int(worker.lstrip("gw") or 0) % len(cores)]
+    os.sched_setaffinity(0, {core})
+    try:
+        yield core
+    finally:
+        os.sched_setaffinity(0, original)
+
+
 @pytest.fixture(scope="session")
 def fixtures_dir():
     """Return path to fixtures directory"""
-    return os.path.join(os.path.dirname(__file__), "fixtures")
+    return str(_FIXTURES_DIR)
 
 
 # ============================================================================
@@ -91,12 +139,56 @@ def mock_vllm_client(mock_vllm_response):
     client.generate.return_value = json.loads(
         mock_vllm_response["choices"][0]["text"]
     )
+    client.generate_batch.side_effect = lambda prompts, **kwargs: [
+        client.generate(prompt=prompt, **kwargs) for prompt in prompts
+    ]
+    client.generate_async = AsyncMock(
+        side_effect=lambda prompt, **kwargs: client.generate(prompt=prompt, **kwargs)
+    )
     client.is_healthy.return_value = True
     client.url = "http://localhost:8000"
     client.model = "meta-llama/Llama-3.2-3B-Instruct"
     return client
 
 
+@pytest.fixture(scope="module")
+def _shared_ai_parser():
+    """AIReceiptParser built once per test module"""
+    from src.ai_receipt_parser import AIReceiptParser
+    return AIReceiptParser(vllm_client=None)
+
+
+@pytest.fixture
+def ai_parser(_shared_ai_parser, mock_vllm_client):
+    """Module-shared AIReceiptParser bound to this test's mock client"""
+    _shared_ai_parser.set_vllm_client(mock_vllm_client)
+    return _shared_ai_parser
+
+
+@pytest.fixture
+def respond_by_prompt(mock_vllm_client, ai_parser):
+    """
+    Make mock_vllm_client answer each receipt's prompt with its expected fields
+
+    Responses are looked up by prompt rather than queued, so they stay matched
+    to their receipts under asyncio.gather and length-binned batches.
+    """
+    def install(receipts):
+        expected_by_prompt = {
+            ai_parser._build_extraction_prompt(r["text"]): r["expected"] for r in receipts
+        }
+        mock_vllm_client.generate.side_effect = lambda prompt, **kwargs: expected_by_prompt[prompt]
+
+    return install
+
+
+@pytest.fixture
+def ai_parser_fresh(mock_vllm_client):
+    """Per-test AIReceiptParser for tests that mutate parser or client state"""
+    from src.ai_receipt_parser import AIReceiptParser
+    return AIReceiptParser(vllm_client=mock_vllm_client)
+
+
 # ============================================================================
 # Sample Receipt Data
 # ============================================================================
@@ -221,54 +313,89 @@ def sample_email_data():
 # Performance Test Data
 # ============================================================================
 
-@pytest.fixture
-def performance_test_receipts():
-    """Generate multiple receipts for performance testing"""
-    receipts = []
-    vendors = ["Whole Foods", "Target", "CVS", "Starbucks", "Amazon"]
+PERFORMANCE_VENDORS = ("Whole Foods", "Target", "CVS", "Starbucks", "Amazon")
 
-    for i in range(100):
-        vendor = vendors[i % len(vendors)]
-        receipts.append({
-            "text": f"""
+PERFORMANCE_RECEIPT_TEMPLATE = """
 {vendor} Store
-Date: 2024-03-{(i % 28) + 1:02d}
+Date: {date}
 Transaction #{i:06d}
 
-Item 1: ${10 + (i % 50)}.99
-Item 2: ${5 + (i % 30)}.49
+Item 1: ${item1}.99
+Item 2: ${item2}.49
+
+Subtotal: ${subtotal}.48
+Tax: ${tax}.20
+Total: ${total}.68
+"""
+
 
-Subtotal: ${15 + (i % 80)}.48
-Tax: ${1 + (i % 10)}.20
-Total: ${16 + (i % 90)}.68
-""",
+def build_performance_receipts(count: int = 100) -> List[Dict[str, Any]]:
+    """Build synthetic receipts with their expected extraction results"""
+    receipts = []
+    for i in range(count):
+        vendor = PERFORMANCE_VENDORS[i % len(PERFORMANCE_VENDORS)]
+        date = f"2024-03-{(i % 28) + 1:02d}"
+        total = 16 + (i % 90)
+        receipts.append({
+            "text": PERFORMANCE_RECEIPT_TEMPLATE.format(
+                vendor=vendor,
+                date=date,
+                i=i,
+                item1=10 + (i % 50),
+                item2=5 + (i % 30),
+                subtotal=15 + (i % 80),
+                tax=1 + (i % 10),
+                total=total,
+            ),
             "expected": {
                 "vendor": vendor,
-                "date": f"2024-03-{(i % 28) + 1:02d}",
-                "total": 16 + (i % 90) + 0.68
+                "date": date,
+                "total": total + 0.68
             }
         })
-
     return receipts
 
 
+@pytest.fixture(scope="session")
+def performance_test_receipts():
+    """Generate multiple receipts for performance testing (built once per session)"""
+    # Tuple so no test can append to or reorder the session-shared sequence
+    return tuple(build_performance_receipts(100))
+
+
 # ============================================================================
 # Error Scenarios
 # ============================================================================
 
+_ITEM_BLOCK = "Item X $9.99\n" * 1000
+
+
+MALFORMED_RECEIPT_TEXTS = {
+    "empty": "",
+    "no_amounts": "Store Name\nDate: 2024-03-15\nThank you!",
+    "invalid_date": "Store\nDate: not-a-date\nTotal: $10.00",
+    "negative_total": "Store\nDate: 2024-03-15\nTotal: -$50.00",
+    "missing_vendor": "Date: 2024-03-15\nTotal: $25.00",
+    "special_chars": "Store™\nDäté: 2024-03-15\nTötäl: €50.00",
+    "very_large": f"STORE\n{_ITEM_BLOCK}Total: $9999.00",
+    "unicode_mixed": "咖啡店 Coffee Shop\n日期 Date: 2024-03-15\nTotal: ¥500",
+}
+
+
 @pytest.fixture
 def malformed_receipt_texts():
     """Various malformed or edge case receipts"""
-    return {
-        "empty": "",
-        "no_amounts": "Store Name\nDate: 2024-03-15\nThank you!",
-        "invalid_date": "Store\nDate: not-a-date\nTotal: $10.00",
-        "negative_total": "Store\nDate: 2024-03-15\nTotal: -$50.00",
-        "missing_vendor": "Date: 2024-03-15\nTotal: $25.00",
-        "special_chars": "Store™\nDäté: 2024-03-15\nTötäl: €50.00",
-        "very_large": "STORE\n" + ("Item X $9.99\n" * 1000) + "Total: $9999.00",
-        "unicode_mixed": "咖啡店 Coffee Shop\n日期 Date: 2024-03-15\nTotal: ¥500",
-    }
+    return dict(MALFORMED_RECEIPT_TEXTS)
+
+
+def pytest_generate_tests(metafunc):
+    """Expand malformed_case into one test per malformed receipt"""
+    if "malformed_case" in metafunc.fixturenames:
+        metafunc.parametrize(
+            "malformed_case",
+            list(MALFORMED_RECEIPT_TEXTS.items()),
+            ids=list(MALFORMED_RECEIPT_TEXTS),
+        )
 
 
 # ============================================================================
@@ -278,7 +405,7 @@ def malformed_receipt_texts():
 @pytest.fixture
 def mock_requests_success(mock_vllm_response):
     """Mock successful HTTP requests"""
-    with patch('requests.post') as mock_post:
+    with patch('requests.Session.post') as mock_post:
         mock_response = Mock()
         mock_response.status_code = 200
         mock_response.json.return_value = mock_vllm_response
@@ -290,7 +417,7 @@ def mock_requests_success(mock_vllm_response):
 @pytest.fixture
 def mock_requests_timeout():
     """Mock HTTP timeout"""
-    with patch('requests.post') as mock_post:
+    with patch('requests.Session.post') as mock_post:
         mock_post.side_effect = TimeoutError("Request timeout")
         yield mock_post
 
@@ -298,7 +425,7 @@ def mock_requests_timeout():
 @pytest.fixture
 def mock_requests_connection_error():
     """Mock connection error"""
-    with patch('requests.post') as mock_post:
+    with patch('requests.Session.post') as mock_post:
         mock_post.side_effect = ConnectionError("Connection refused")
         yield mock_post
 
@@ -306,7 +433,7 @@ def mock_requests_connection_error():
 @pytest.fixture
 def mock_requests_server_error():
     """Mock server error response"""
-    with patch('requests.post') as mock_post:
+    with patch('requests.Session.post') as mock_post:
         mock_response = Mock()
         mock_response.status_code = 503
         mock_response.text = "Service Unavailable"
@@ -319,42 +446,63 @@ def mock_requests_server_error():
 # Test Utilities
 # ============================================================================
 
-@pytest.fixture
-def assert_receipt_fields():
-    """Utility to assert receipt fields are valid"""
-    def _assert(fields: Dict[str, Any], required_keys: List[str] = None):
-        if required_keys is None:
-            required_keys = ["vendor", "date", "total"]
+def check_receipt_fields(fields: Dict[str, Any], required_keys: List[str] = None):
+    """Assert receipt fields are present and well-formed"""
+    if required_keys is None:
+        required_keys = ["vendor", "date", "total"]
 
-        for key in required_keys:
-            assert key in fields, f"Missing required field: {key}"
-            assert fields[key] is not None, f"Field {key} is None"
-            assert fields[key] != "", f"Field {key} is empty"
+    for key in required_keys:
+        assert key in fields, f"Missing required field: {key}"
+        assert fields[key] is not None, f"Field {key} is None"
+        assert fields[key] != "", f"Field {key} is empty"
 
-        # Validate data types
-        if "total" in fields:
-            assert isinstance(fields["total"], (int, float)), "Total must be numeric"
-            assert fields["total"] > 0, "Total must be positive"
+    # Validate data types
+    if "total" in fields:
+        assert isinstance(fields["total"], (int, float)), "Total must be numeric"
+        assert fields["total"] > 0, "Total must be positive"
 
-        if "date" in fields:
-            assert len(fields["date"]) >= 8, "Date too short"
+    if "date" in fields:
+        assert len(fields["date"]) >= 8, "Date too short"
 
-        if "confidence" in fields:
-            for key, score in fields["confidence"].items():
-                assert 0 <= score <= 1, f"Confidence {key} out of range: {score}"
+    if "confidence" in fields:
+        for key, score in fields["confidence"].items():
+            assert 0 <= score <= 1, f"Confidence {key} out of range: {score}"
 
-    return _assert
 
+def read_fixture(filename: str):
+    """Read a file from the fixtures directory, decoding JSON files"""
+    path = _FIXTURES_DIR / filename
+    data = path.read_bytes()
+    if path.suffix == '.json':
+        return orjson.loads(data)
+    return data.decode('utf-8')
 
-@pytest.fixture
+
+@pytest.fixture(scope="session")
+def assert_receipt_fields():
+    """Utility to assert receipt fields are valid"""
+    return check_receipt_fields
+
+
+@pytest.fixture(scope="session")
 def load_fixture():
     """Load fixture file"""
-    def _load(filename: str):
-        fixtures_path = os.path.join(
-            os.path.dirname(__file__), "fixtures", filename
-        )
-        with open(fixtures_path, 'r') as f:
-            if filename.endswith('.json'):
-                return json.load(f)
-            return f.read()
-    return _load
+    return read_fixture
+
+
+# ============================================================================
+# Session Hooks
+# ============================================================================
+
+def pytest_sessionstart(session):
+    """Warm lazily-loaded parser dependencies before any test is timed"""
+    config = session.config
+    if getattr(config.option, "dist", "no") != "no" and not hasattr(config, "workerinput"):
+        return  # xdist controller process runs no tests
+
+    from src.ai_receipt_parser import AIReceiptParser
+
+    # First dateparser call loads its language data (~50ms)
+    AIReceiptParser(vllm_client=None, use_fallback=True).extract_fields(
+        "warmup $1.00 2024-01-01", {}
+    )
@@ -1,8 +1,16 @@
 """
 Basic functionality tests - unskipped tests to verify implementation
 """
+import asyncio
+import json
+import os
 import pytest
-from src.vllm_client import VLLMClient
+import requests
+from tenacity import wait_none
+from unittest.mock import AsyncMock, MagicMock, Mock, patch
+from src.vllm_client import (
+    VLLMClient, VLLMClientError, VLLMConnectionError, VLLMResponse, VLLMTimeoutError,
+)
 from src.ai_receipt_parser import AIReceiptParser
 
 
@@ -44,6 +52,92 @@ class TestVLLMClientBasics:
         assert client.timeout == 60
         assert client.max_retries == 5
 
+    def test_generate_reuses_pooled_session(self):
+        """Test sync generation posts through the client's keep-alive session"""
+        client = VLLMClient(server_url="http://localhost:8000")
+        response = Mock(status_code=200)
+        response.json.return_value = {
+            "model": "test-model",
+            "choices": [{"index": 0, "text": '{"vendor": "Store"}', "finish_reason": "stop"}],
+        }
+
+        with patch.object(client._http, "post", return_value=response) as mock_post:
+            first = client.generate("prompt one")
+            client.generate("prompt two")
+
+        assert mock_post.call_count == 2
+        assert mock_post.call_args.args[0] == client.completions_url
+        assert first.text == '{"vendor": "Store"}'
+        assert first.confidence == 0.9
+
+    def test_generate_retries_up_to_max_retries(self):
+        """Test sync generation makes max_retries attempts on timeouts"""
+        client = VLLMClient(server_url="http://localhost:8000", max_retries=2)
+        client._retrying = client._retrying.copy(wait=wait_none())
+
+        with patch.object(client._http, "post", side_effect=requests.Timeout()) as mock_post:
+            with pytest.raises(VLLMTimeoutError):
+                client.generate("prompt")
+
+        assert mock_post.call_count == 2
+
+    def test_generate_does_not_retry_refused_connection(self):
+        """Test a refused connection fails on the first attempt"""
+        client = VLLMClient(server_url="http://localhost:8000", max_retries=3)
+
+        def refuse(*args, **kwargs):
+            try:
+                raise ConnectionRefusedError()
+            except ConnectionRefusedError:
+                raise requests.ConnectionError("Connection refused")
+
+        with patch.object(client._http, "post", side_effect=refuse) as mock_post:
+            with pytest.raises(VLLMConnectionError):
+                client.generate("prompt")
+
+        assert mock_post.call_count == 1
+
+    @staticmethod
+    def _sse_response(*texts: str) -> MagicMock:
+        response = MagicMock(status_code=200)
+        response.__enter__.return_value = response
+        lines = [
+            b"data: " + json.dumps({"model": "test-model", "choices": [{"index": 0, "text": t}]}).encode()
+            for t in texts
+        ]
+        response.iter_lines.return_value = iter(lines + [b"data: [DONE]"])
+        return response
+
+    def test_generate_stream_stops_at_closing_brace(self):
+        """Test streaming returns once the JSON object closes, ignoring trailing tokens"""
+        client = VLLMClient(server_url="http://localhost:8000", stream=True)
+        response = self._sse_response('{"vendor": ', '"Store {1}"', ', "total": 5}', " trailing", " text")
+
+        with patch.object(client._http, "post", return_value=response) as mock_post:
+            result = client.generate("prompt")
+
+        assert mock_post.call_args.kwargs["stream"] is True
+        assert mock_post.call_args.kwargs["json"]["stream"] is True
+        assert json.loads(result.text) == {"vendor": "Store {1}", "total": 5}
+        assert result.confidence == 0.9
+        # The two trailing chunks and [DONE] were never read
+        assert len(list(response.iter_lines.return_value)) == 3
+
+    def test_generate_stream_malformed_event_falls_back(self):
+        """Test a truncated stream event becomes a client error and the parser falls back to regex"""
+        client = VLLMClient(server_url="http://localhost:8000", stream=True)
+        parser = AIReceiptParser(vllm_client=client, use_fallback=True)
+        response = self._sse_response()
+        response.iter_lines.side_effect = lambda: iter([b'data: {"model": "test-model", "choi'])
+
+        with patch.object(client._http, "post", return_value=response):
+            with pytest.raises(VLLMClientError):
+                client.generate("prompt")
+            result = parser.extract_fields("Invoice #12345\nTotal: $150.00")
+
+        assert result["extraction_method"] == "regex"
+        assert result["claim_amount"] == 150.0
+
 
 class TestAIReceiptParserBasics:
     """Basic AIReceiptParser tests"""
@@ -70,6 +164,158 @@ class TestAIReceiptParserBasics:
         # With regex fallback, should extract something
         assert len(result) > 0
 
+    def test_extract_fields_cached(self):
+        """Test cached extraction reuses read-only results"""
+        parser = AIReceiptParser(vllm_client=None, use_fallback=True)
+        text = "Invoice #12345\nTotal: $150.00"
+
+        first = parser.extract_fields_cached(text, {"subject": "Receipt"})
+        second = parser.extract_fields_cached(text, {"subject": "Receipt"})
+
+        assert first is second
+        assert dict(first) == parser.extract_fields(text, {"subject": "Receipt"})
+        with pytest.raises(TypeError):
+            first["vendor"] = "changed"
+
+    def test_extract_fields_cached_list_metadata(self):
+        """Test cached extraction accepts list-valued email metadata"""
+        parser = AIReceiptParser(vllm_client=None, use_fallback=True)
+        text = "Invoice #12345\nTotal: $150.00"
+        email_data = {"subject": "Receipt", "attachments": []}
+
+        first = parser.extract_fields_cached(text, email_data)
+        second = parser.extract_fields_cached(text, dict(email_data))
+
+        assert first is second
+        assert dict(first) == parser.extract_fields(text, email_data)
+
+    def test_extract_fields_cached_invalidated(self):
+        """Test reassigning the client or fallback flag drops cached results"""
+        parser = AIReceiptParser(vllm_client=None, use_fallback=True)
+        text = "Invoice #12345\nTotal: $150.00"
+
+        first = parser.extract_fields_cached(text)
+        parser.vllm_client = None
+        second = parser.extract_fields_cached(text)
+        parser.use_fallback = False
+        third = parser.extract_fields_cached(text)
+
+        assert first is not second
+        assert third is not second
+
+
+class TestBatchExtraction:
+    """AIReceiptParser.extract_batch with a stubbed batch endpoint"""
+
+    @staticmethod
+    def _response(vendor: str, amount: float) -> VLLMResponse:
+        return VLLMResponse(
+            text=f'{{"vendor": "{vendor}", "claim_amount": {amount}}}',
+            confidence=0.9,
+            model="test-model",
+            usage={},
+            raw_response={},
+        )
+
+    def test_extract_batch_single_request(self):
+        """Test all receipts go to the server in one batched call, in order"""
+        client = VLLMClient(server_url="http://localhost:8000")
+        client.generate_batch = Mock(return_value=[
+            self._response("Clinic A", 10.0),
+            self._response("Clinic B", 20.0),
+        ])
+        parser = AIReceiptParser(vllm_client=client)
+
+        results = parser.extract_batch(
+            ["Clinic A\nTotal: $10.00", "", "Clinic B\nTotal: $20.00"], n_bins=1
+        )
+
+        client.generate_batch.assert_called_once()
+        assert len(client.generate_batch.call_args.kwargs["prompts"]) == 2
+        assert client.generate_batch.call_args.kwargs.items() >= AIReceiptParser.GENERATION_KWARGS.items()
+        assert [r["vendor"] for r in results] == ["Clinic A", None, "Clinic B"]
+        assert [r["claim_amount"] for r in results] == [10.0, None, 20.0]
+        assert results[1]["extraction_method"] == "none"
+
+    def test_extract_batch_falls_back_per_receipt(self):
+        """Test an unparseable response only falls back for its own receipt"""
+        client = VLLMClient(server_url="http://localhost:8000")
+        bad = VLLMResponse(text="no json here", confidence=0.9, model="m", usage={}, raw_response={})
+        client.generate_batch = Mock(return_value=[self._response("Clinic A", 10.0), bad])
+        parser = AIReceiptParser(vllm_client=client, use_fallback=True)
+
+        results = parser.extract_batch(["Clinic A\nTotal: $10.00", "Clinic B\nTotal: $20.00"], n_bins=1)
+
+        assert results[0]["extraction_method"] == "ai"
+        assert results[1]["extraction_method"] == "regex"
+        assert results[1]["claim_amount"] == 20.0
+
+    def test_prompts_share_cacheable_prefix(self):
+        """Test request prompts differ only after the shared instruction prefix"""
+        client = VLLMClient(server_url="http://localhost:8000")
+        parser = AIReceiptParser(vllm_client=client)
+
+        payload = client._build_payload(
+            [parser._build_extraction_prompt("Clinic A"), parser._build_extraction_prompt("Clinic B")],
+            parser.SYSTEM_PROMPT, None, None
+        )
+        shared = os.path.commonprefix(payload["prompt"])
+        template_prefix = parser.EXTRACTION_PROMPT_TEMPLATE.split("{text}")[0]
+
+        assert shared.startswith(parser.SYSTEM_PROMPT)
+        assert template_prefix in shared
+
+    def test_extract_batch_bins_by_length(self):
+        """Test receipts are sent in length bins and stitched back in order"""
+        client = VLLMClient(server_url="http://localhost:8000")
+        client.generate_batch = Mock(side_effect=lambda prompts, **kwargs: [
+            self._response("Clinic", float(len(p))) for p in prompts
+        ])
+        parser = AIReceiptParser(vllm_client=client)
+        texts = ["x" * 900, "x" * 10, "x" * 500, "x" * 20]
+
+        results = parser.extract_batch(texts, n_bins=2)
+
+        assert client.generate_batch.call_count == 2
+        first_bin = client.generate_batch.call_args_list[0].kwargs["prompts"]
+        assert [len(p) for p in first_bin] == sorted(len(p) for p in first_bin)
+        expected = [float(len(parser._build_extraction_prompt(t))) for t in texts]
+        assert [r["claim_amount"] for r in results] == expected
+
+    def test_bin_partitions_by_length(self):
+        """Test _bin groups indices shortest-first into at most n_bins bins"""
+        bins = AIReceiptParser._bin(["aaaa", "a", "aaa", "aa", "aaaaa"], n_bins=2)
+
+        assert bins == [[1, 3, 2], [0, 4]]
+        assert AIReceiptParser._bin(["a"], n_bins=4) == [[0]]
+        assert AIReceiptParser._bin([], n_bins=4) == []
+
+
+class TestAsyncExtraction:
+    """AIReceiptParser.aextract_fields with a stubbed async client"""
+
+    def test_aextract_fields_concurrent(self):
+        """Test concurrent async extractions each await the client"""
+        client = VLLMClient(server_url="http://localhost:8000")
+        client.generate_async = AsyncMock(return_value=VLLMResponse(
+            text='{"vendor": "Clinic", "claim_amount": 42.0}',
+            confidence=0.9,
+            model="test-model",
+            usage={},
+            raw_response={},
+        ))
+        parser = AIReceiptParser(vllm_client=client)
+
+        async def run():
+            return await asyncio.gather(*(parser.aextract_fields(f"Receipt {i}") for i in range(5)))
+
+        results = asyncio.run(run())
+
+        assert client.generate_async.await_count == 5
+        assert client.generate_async.call_args.kwargs.items() >= AIReceiptParser.GENERATION_KWARGS.items()
+        assert all(r["claim_amount"] == 42.0 for r in results)
+        assert all(r["extraction_method"] == "ai" for r in results)
+
 
 class TestImports:
     """Test that modules can be imported"""
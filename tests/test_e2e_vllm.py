@@ -3,10 +3,16 @@ End-to-End Tests for vLLM Integration
 Tests complete pipeline from receipt text to structured output
 """
 import pytest
-import json
+import orjson
 import subprocess
 import os
-from pathlib import Path
+import time
+import psutil
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from src.ai_receipt_parser import AIReceiptParser
+from src.vllm_client import VLLMClient
 
 # These tests will run once the full implementation is complete
 pytestmark = pytest.mark.e2e
@@ -22,9 +28,6 @@ class TestCompletePipeline:
     @pytest.mark.skip(reason="Waiting for full implementation")
     def test_full_pipeline(self, sample_receipt_text, tmp_path):
         """Test complete pipeline from text to JSON output"""
-        from src.ai_receipt_parser import AIReceiptParser
-        from src.vllm_client import VLLMClient
-
         # Create temporary input file
         input_file = tmp_path / "receipt.txt"
         input_file.write_text(sample_receipt_text)
@@ -36,20 +39,17 @@ class TestCompletePipeline:
 
         # Save output
         output_file = tmp_path / "output.json"
-        output_file.write_text(json.dumps(result, indent=2))
+        output_file.write_bytes(orjson.dumps(result, option=orjson.OPT_INDENT_2))
 
         # Verify output
         assert output_file.exists()
-        output_data = json.loads(output_file.read_text())
+        output_data = orjson.loads(output_file.read_bytes())
         assert "vendor" in output_data
         assert "total" in output_data
 
     @pytest.mark.skip(reason="Waiting for full implementation")
     def test_pipeline_with_email_data(self, sample_receipt_text, sample_email_data, tmp_path):
         """Test pipeline with email metadata"""
-        from src.ai_receipt_parser import AIReceiptParser
-        from src.vllm_client import VLLMClient
-
         client = VLLMClient()
         parser = AIReceiptParser(vllm_client=client)
         result = parser.extract_fields(sample_receipt_text, email_data=sample_email_data)
@@ -86,8 +86,7 @@ class TestCLIIntegration:
         assert output_file.exists()
 
         # Verify output
-        with open(output_file) as f:
-            data = json.load(f)
+        data = orjson.loads(output_file.read_bytes())
         assert "vendor" in data
 
     @pytest.mark.skip(reason="Waiting for CLI implementation")
@@ -129,9 +128,6 @@ class TestJSONOutput:
     @pytest.mark.skip(reason="Waiting for full implementation")
     def test_output_schema(self, sample_receipt_text):
         """Test output conforms to expected schema"""
-        from src.ai_receipt_parser import AIReceiptParser
-        from src.vllm_client import VLLMClient
-
         client = VLLMClient()
         parser = AIReceiptParser(vllm_client=client)
         result = parser.extract_fields(sample_receipt_text)
@@ -150,19 +146,16 @@ class TestJSONOutput:
     @pytest.mark.skip(reason="Waiting for full implementation")
     def test_json_serialization(self, sample_receipt_text):
         """Test result can be serialized to JSON"""
-        from src.ai_receipt_parser import AIReceiptParser
-        from src.vllm_client import VLLMClient
-
         client = VLLMClient()
         parser = AIReceiptParser(vllm_client=client)
         result = parser.extract_fields(sample_receipt_text)
 
         # Should serialize without errors
-        json_str = json.dumps(result)
+        json_str = orjson.dumps(result)
         assert len(json_str) > 0
 
         # Should deserialize back
-        parsed = json.loads(json_str)
+        parsed = orjson.loads(json_str)
         assert parsed == result
 
 
@@ -176,9 +169,6 @@ class TestErrorRecovery:
     @pytest.mark.skip(reason="Waiting for full implementation")
     def test_recover_from_ai_failure(self, sample_receipt_text):
         """Test pipeline recovers from AI service failure"""
-        from src.ai_receipt_parser import AIReceiptParser
-        from src.vllm_client import VLLMClient
-
         client = VLLMClient()
         parser = AIReceiptParser(
             vllm_client=client,
@@ -197,9 +187,6 @@ class TestErrorRecovery:
     @pytest.mark.skip(reason="Waiting for full implementation")
     def test_partial_extraction_on_error(self, malformed_receipt_texts):
         """Test partial extraction when some fields fail"""
-        from src.ai_receipt_parser import AIReceiptParser
-        from src.vllm_client import VLLMClient
-
         client = VLLMClient()
         parser = AIReceiptParser(vllm_client=client)
 
@@ -222,8 +209,6 @@ class TestSystemIntegration:
     def test_integration_with_receipt_parser(self, sample_receipt_text):
         """Test AI parser integrates with existing ReceiptParser"""
         from receipt_parser import ReceiptParser
-        from src.ai_receipt_parser import AIReceiptParser
-        from src.vllm_client import VLLMClient
 
         # Traditional parser
         traditional = ReceiptParser()
@@ -244,8 +229,6 @@ class TestSystemIntegration:
     def test_hybrid_mode_enhancement(self, sample_receipt_text):
         """Test hybrid mode improves over regex-only"""
         from receipt_parser import ReceiptParser
-        from src.ai_receipt_parser import AIReceiptParser
-        from src.vllm_client import VLLMClient
 
         # Traditional regex-based
         traditional = ReceiptParser()
@@ -274,35 +257,33 @@ class TestPerformanceE2E:
     @pytest.mark.slow
     def test_throughput(self, performance_test_receipts):
         """Test system throughput"""
-        from src.ai_receipt_parser import AIReceiptParser
-        from src.vllm_client import VLLMClient
-        import time
+        texts = [receipt["text"] for receipt in performance_test_receipts[:50]]
 
-        client = VLLMClient()
-        parser = AIReceiptParser(vllm_client=client)
+        # One client per worker thread: requests.Session is not documented
+        # as thread-safe, so workers must not share one
+        local = threading.local()
 
-        start = time.time()
-        results = []
+        def extract(text):
+            if not hasattr(local, "parser"):
+                local.parser = AIReceiptParser(vllm_client=VLLMClient())
+            return local.parser.extract_fields(text)
 
-        for receipt in performance_test_receipts[:50]:
-            result = parser.extract_fields(receipt["text"])
-            results.append(result)
+        # Overlap request round-trips so vLLM's continuous batcher sees
+        # concurrent sequences; keep workers within the server's --max-num-seqs.
+        start = time.time()
+        with ThreadPoolExecutor(max_workers=16) as executor:
+            results = list(executor.map(extract, texts))
 
         duration = time.time() - start
         throughput = len(results) / duration
 
-        # Should process at least 1 receipt per second
-        assert throughput >= 1.0, f"Throughput too low: {throughput} receipts/sec"
+        # 16 in-flight requests should sustain several receipts per second
+        assert throughput >= 4.0, f"Throughput too low: {throughput} receipts/sec"
 
     @pytest.mark.skip(reason="Waiting for full implementation")
     @pytest.mark.slow
     def test_memory_usage(self, performance_test_receipts):
         """Test memory usage stays within bounds"""
-        from src.ai_receipt_parser import AIReceiptParser
-        from src.vllm_client import VLLMClient
-        import psutil
-        import os
-
         process = psutil.Process(os.getpid())
         initial_memory = process.memory_info().rss / 1024 / 1024  # MB
 
@@ -331,8 +312,6 @@ class TestLiveVLLMServer:
     @pytest.mark.live
     def test_live_server_connection(self, test_config):
         """Test connection to live vLLM server"""
-        from src.vllm_client import VLLMClient
-
         client = VLLMClient(url=test_config["vllm_url"])
 
         # Test health check
@@ -343,9 +322,6 @@ class TestLiveVLLMServer:
     @pytest.mark.live
     def test_live_extraction(self, sample_receipt_text, test_config):
         """Test extraction with live vLLM server"""
-        from src.ai_receipt_parser import AIReceiptParser
-        from src.vllm_client import VLLMClient
-
         client = VLLMClient(url=test_config["vllm_url"])
         parser = AIReceiptParser(vllm_client=client)
 
@@ -354,7 +330,8 @@ class TestLiveVLLMServer:
         # Verify extraction succeeded
         assert "vendor" in result
         assert "total" in result
-        assert result["total"] > 0
+        # Guards against accuracy loss from the server's quantization
+        assert result["total"] > 0, f"No total extracted with {test_config['quantization']} weights"
 
         # Verify confidence scores
         assert "confidence" in result
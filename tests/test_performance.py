@@ -3,11 +3,20 @@ Performance Tests and Benchmarks for vLLM Integration
 Tests throughput, latency, memory usage, and scalability
 """
 import pytest
+import asyncio
+import gc
 import time
+import numpy as np
+import orjson
 import psutil
 import os
+import statistics
+import threading
 from unittest.mock import Mock, patch
-from typing import List, Dict, Any
+
+from src.ai_receipt_parser import AIReceiptParser
+from src.vllm_client import VLLMClient
+from tests.test_utils import stable_timing
 
 # These tests are marked as slow and can be run with: pytest -m slow
 pytestmark = pytest.mark.slow
@@ -17,41 +26,38 @@ pytestmark = pytest.mark.slow
 # Latency Tests
 # ============================================================================
 
+@pytest.mark.usefixtures("pinned_cpu")
 class TestLatency:
     """Test response latency and timing"""
 
     @pytest.mark.skip(reason="Waiting for implementation")
-    def test_single_extraction_latency(self, sample_receipt_text, mock_vllm_client):
+    def test_single_extraction_latency(self, sample_receipt_text, ai_parser):
         """Test single extraction completes within acceptable time"""
-        from src.ai_receipt_parser import AIReceiptParser
-
-        parser = AIReceiptParser(vllm_client=mock_vllm_client)
-
-        start = time.time()
-        result = parser.extract_fields(sample_receipt_text)
-        latency = time.time() - start
+        with stable_timing():
+            start = time.time()
+            result = ai_parser.extract_fields(sample_receipt_text)
+            latency = time.time() - start
 
         assert latency < 3.0, f"Extraction too slow: {latency:.2f}s"
         assert "vendor" in result
 
     @pytest.mark.skip(reason="Waiting for implementation")
-    def test_average_latency(self, performance_test_receipts, mock_vllm_client):
+    def test_average_latency(self, performance_test_receipts, mock_vllm_client, ai_parser):
         """Test average latency across multiple extractions"""
-        from src.ai_receipt_parser import AIReceiptParser
-
-        parser = AIReceiptParser(vllm_client=mock_vllm_client)
-        latencies = []
-
-        for receipt in performance_test_receipts[:20]:
-            mock_vllm_client.generate.return_value = receipt["expected"]
+        num_receipts = 20
+        latencies = np.empty(num_receipts, dtype=np.float64)
+        mock_vllm_client.generate.side_effect = [
+            r["expected"] for r in performance_test_receipts[:num_receipts]
+        ]
 
-            start = time.time()
-            parser.extract_fields(receipt["text"])
-            latency = time.time() - start
-            latencies.append(latency)
+        with stable_timing():
+            for i, receipt in enumerate(performance_test_receipts[:num_receipts]):
+                start = time.perf_counter()
+                ai_parser.extract_fields(receipt["text"])
+                latencies[i] = time.perf_counter() - start
 
-        avg_latency = sum(latencies) / len(latencies)
-        p95_latency = sorted(latencies)[int(len(latencies) * 0.95)]
+        avg_latency = latencies.mean()
+        p95_latency = np.percentile(latencies, 95)
 
         assert avg_latency < 2.0, f"Average latency too high: {avg_latency:.2f}s"
         assert p95_latency < 4.0, f"P95 latency too high: {p95_latency:.2f}s"
@@ -59,9 +65,6 @@ class TestLatency:
     @pytest.mark.skip(reason="Waiting for implementation")
     def test_cold_start_latency(self, sample_receipt_text):
         """Test cold start (first request) latency"""
-        from src.ai_receipt_parser import AIReceiptParser
-        from src.vllm_client import VLLMClient
-
         # First request (cold start)
         client = VLLMClient()
         parser = AIReceiptParser(vllm_client=client)
@@ -87,39 +90,33 @@ class TestThroughput:
     """Test system throughput and processing capacity"""
 
     @pytest.mark.skip(reason="Waiting for implementation")
-    def test_receipts_per_second(self, performance_test_receipts, mock_vllm_client):
+    def test_receipts_per_second(self, performance_test_receipts, mock_vllm_client, ai_parser, respond_by_prompt):
         """Test receipts processed per second"""
-        from src.ai_receipt_parser import AIReceiptParser
-
-        parser = AIReceiptParser(vllm_client=mock_vllm_client)
         num_receipts = 50
+        respond_by_prompt(performance_test_receipts[:num_receipts])
+
+        texts = [r["text"] for r in performance_test_receipts[:num_receipts]]
 
         start = time.time()
-        for receipt in performance_test_receipts[:num_receipts]:
-            mock_vllm_client.generate.return_value = receipt["expected"]
-            parser.extract_fields(receipt["text"])
+        results = ai_parser.extract_batch(texts)
         duration = time.time() - start
 
+        assert len(results) == num_receipts
+        # One batched request per length bin
+        assert mock_vllm_client.generate_batch.call_count == len(ai_parser._bin(texts))
         throughput = num_receipts / duration
         assert throughput >= 1.0, f"Throughput too low: {throughput:.2f} receipts/sec"
 
     @pytest.mark.skip(reason="Waiting for implementation")
     @pytest.mark.asyncio
-    async def test_concurrent_processing(self, performance_test_receipts, mock_vllm_client):
+    async def test_concurrent_processing(self, performance_test_receipts, ai_parser, respond_by_prompt):
         """Test concurrent receipt processing"""
-        from src.ai_receipt_parser import AIReceiptParser
-        import asyncio
-
-        parser = AIReceiptParser(vllm_client=mock_vllm_client)
         num_receipts = 20
-
-        async def process_receipt(text, expected):
-            mock_vllm_client.generate.return_value = expected
-            return parser.extract_fields(text)
+        respond_by_prompt(performance_test_receipts[:num_receipts])
 
         start = time.time()
         tasks = [
-            process_receipt(r["text"], r["expected"])
+            ai_parser.aextract_fields(r["text"])
             for r in performance_test_receipts[:num_receipts]
         ]
         results = await asyncio.gather(*tasks)
@@ -139,17 +136,14 @@ class TestMemoryUsage:
     """Test memory consumption and leaks"""
 
     @pytest.mark.skip(reason="Waiting for implementation")
-    def test_memory_per_extraction(self, sample_receipt_text, mock_vllm_client):
+    def test_memory_per_extraction(self, sample_receipt_text, ai_parser):
         """Test memory usage per extraction"""
-        from src.ai_receipt_parser import AIReceiptParser
-
         process = psutil.Process(os.getpid())
-        parser = AIReceiptParser(vllm_client=mock_vllm_client)
 
         initial_memory = process.memory_info().rss / 1024 / 1024  # MB
 
         # Process single receipt
-        parser.extract_fields(sample_receipt_text)
+        ai_parser.extract_fields(sample_receipt_text)
 
         final_memory = process.memory_info().rss / 1024 / 1024  # MB
         memory_increase = final_memory - initial_memory
@@ -158,20 +152,16 @@ class TestMemoryUsage:
         assert memory_increase < 10, f"Excessive memory per extraction: {memory_increase:.2f}MB"
 
     @pytest.mark.skip(reason="Waiting for implementation")
-    def test_memory_leak(self, performance_test_receipts, mock_vllm_client):
+    def test_memory_leak(self, performance_test_receipts, ai_parser, respond_by_prompt):
         """Test for memory leaks during repeated processing"""
-        from src.ai_receipt_parser import AIReceiptParser
-        import gc
-
         process = psutil.Process(os.getpid())
-        parser = AIReceiptParser(vllm_client=mock_vllm_client)
 
         initial_memory = process.memory_info().rss / 1024 / 1024  # MB
 
         # Process many receipts
+        respond_by_prompt(performance_test_receipts)
         for i, receipt in enumerate(performance_test_receipts):
-            mock_vllm_client.generate.return_value = receipt["expected"]
-            parser.extract_fields(receipt["text"])
+            ai_parser.extract_fields(receipt["text"])
 
             # Force garbage collection periodically
             if i % 20 == 0:
@@ -184,18 +174,15 @@ class TestMemoryUsage:
         assert memory_increase < 100, f"Potential memory leak: {memory_increase:.2f}MB"
 
     @pytest.mark.skip(reason="Waiting for implementation")
-    def test_large_receipt_memory(self, mock_vllm_client):
+    def test_large_receipt_memory(self, mock_vllm_client, ai_parser):
         """Test memory usage with very large receipts"""
-        from src.ai_receipt_parser import AIReceiptParser
-
         # Generate large receipt (1000+ lines)
-        large_receipt = "Mega Store\nDate: 2024-03-15\n\n"
-        for i in range(1000):
-            large_receipt += f"Item {i}: ${i % 100}.99\n"
-        large_receipt += "\nTotal: $50000.00"
+        lines = ["Mega Store", "Date: 2024-03-15", ""]
+        lines.extend(f"Item {i}: ${i % 100}.99" for i in range(1000))
+        lines.extend(["", "Total: $50000.00"])
+        large_receipt = "\n".join(lines)
 
         process = psutil.Process(os.getpid())
-        parser = AIReceiptParser(vllm_client=mock_vllm_client)
 
         initial_memory = process.memory_info().rss / 1024 / 1024
 
@@ -205,7 +192,7 @@ class TestMemoryUsage:
             "total": 50000.00
         }
 
-        parser.extract_fields(large_receipt)
+        ai_parser.extract_fields(large_receipt)
 
         final_memory = process.memory_info().rss / 1024 / 1024
         memory_increase = final_memory - initial_memory
@@ -222,19 +209,14 @@ class TestScalability:
     """Test system scalability characteristics"""
 
     @pytest.mark.skip(reason="Waiting for implementation")
-    def test_batch_size_scaling(self, performance_test_receipts, mock_vllm_client):
+    def test_batch_size_scaling(self, performance_test_receipts, ai_parser):
         """Test performance with increasing batch sizes"""
-        from src.ai_receipt_parser import AIReceiptParser
-
-        parser = AIReceiptParser(vllm_client=mock_vllm_client)
         batch_sizes = [10, 20, 50, 100]
         results = {}
 
         for batch_size in batch_sizes:
             start = time.time()
-            for receipt in performance_test_receipts[:batch_size]:
-                mock_vllm_client.generate.return_value = receipt["expected"]
-                parser.extract_fields(receipt["text"])
+            ai_parser.extract_batch([r["text"] for r in performance_test_receipts[:batch_size]])
             duration = time.time() - start
 
             throughput = batch_size / duration
@@ -244,18 +226,14 @@ class TestScalability:
         assert results[100] >= results[10] * 0.7, "Poor scalability with batch size"
 
     @pytest.mark.skip(reason="Waiting for implementation")
-    def test_receipt_length_scaling(self, mock_vllm_client):
+    def test_receipt_length_scaling(self, mock_vllm_client, ai_parser):
         """Test performance with varying receipt lengths"""
-        from src.ai_receipt_parser import AIReceiptParser
-
-        parser = AIReceiptParser(vllm_client=mock_vllm_client)
         lengths = [10, 50, 100, 500, 1000]
         latencies = {}
 
         for length in lengths:
-            receipt = "Store\nDate: 2024-03-15\n"
-            receipt += "\n".join([f"Item {i}: ${i}.99" for i in range(length)])
-            receipt += f"\nTotal: ${length * 10}.00"
+            body = "\n".join(map("Item {0}: ${0}.99".format, range(length)))
+            receipt = f"Store\nDate: 2024-03-15\n{body}\nTotal: ${length * 10}.00"
 
             mock_vllm_client.generate.return_value = {
                 "vendor": "Store",
@@ -264,7 +242,7 @@ class TestScalability:
             }
 
             start = time.time()
-            parser.extract_fields(receipt)
+            ai_parser.extract_fields(receipt)
             latency = time.time() - start
             latencies[length] = latency
 
@@ -280,42 +258,34 @@ class TestCaching:
     """Test caching and optimization strategies"""
 
     @pytest.mark.skip(reason="Waiting for implementation")
-    def test_prompt_caching(self, sample_receipt_text, mock_vllm_client):
-        """Test prompt caching improves performance"""
-        from src.ai_receipt_parser import AIReceiptParser
+    def test_prompt_caching(self, sample_receipt_text, sample_receipt_minimal, mock_vllm_client, ai_parser):
+        """Test distinct receipts share a cacheable prompt prefix"""
+        ai_parser.extract_fields(sample_receipt_text)
+        ai_parser.extract_fields(sample_receipt_minimal)
 
-        parser = AIReceiptParser(vllm_client=mock_vllm_client, enable_caching=True)
+        first, second = mock_vllm_client.generate.call_args_list
+        assert first.kwargs["system_prompt"] == second.kwargs["system_prompt"]
 
-        # First extraction
-        start = time.time()
-        parser.extract_fields(sample_receipt_text)
-        first_time = time.time() - start
-
-        # Second extraction (should be cached)
-        start = time.time()
-        parser.extract_fields(sample_receipt_text)
-        second_time = time.time() - start
-
-        # Cached request should be faster
-        assert second_time < first_time * 0.5, "Caching not effective"
+        # Everything before the receipt text must be byte-identical so the
+        # server-side prefix cache (--enable-prefix-caching) can reuse it
+        shared_prefix = AIReceiptParser.EXTRACTION_PROMPT_TEMPLATE.split("{text}")[0]
+        assert first.kwargs["prompt"].startswith(shared_prefix)
+        assert second.kwargs["prompt"].startswith(shared_prefix)
 
     @pytest.mark.skip(reason="Waiting for implementation")
-    def test_batch_optimization(self, performance_test_receipts, mock_vllm_client):
+    def test_batch_optimization(self, performance_test_receipts, ai_parser, respond_by_prompt):
         """Test batch processing optimization"""
-        from src.ai_receipt_parser import AIReceiptParser
-
-        parser = AIReceiptParser(vllm_client=mock_vllm_client)
+        respond_by_prompt(performance_test_receipts[:20])
 
         # Sequential processing
         start = time.time()
         for receipt in performance_test_receipts[:20]:
-            mock_vllm_client.generate.return_value = receipt["expected"]
-            parser.extract_fields(receipt["text"])
+            ai_parser.extract_fields(receipt["text"])
         sequential_time = time.time() - start
 
         # Batch processing
         start = time.time()
-        batch_results = parser.extract_batch([r["text"] for r in performance_test_receipts[:20]])
+        batch_results = ai_parser.extract_batch([r["text"] for r in performance_test_receipts[:20]])
         batch_time = time.time() - start
 
         # Batch should be faster
@@ -330,32 +300,40 @@ class TestResourceUsage:
     """Test CPU, network, and other resource usage"""
 
     @pytest.mark.skip(reason="Waiting for implementation")
-    def test_cpu_usage(self, performance_test_receipts, mock_vllm_client):
+    def test_cpu_usage(self, performance_test_receipts, mock_vllm_client, ai_parser):
         """Test CPU usage during processing"""
-        from src.ai_receipt_parser import AIReceiptParser
-
         process = psutil.Process(os.getpid())
-        parser = AIReceiptParser(vllm_client=mock_vllm_client)
-
-        # Measure CPU usage
-        cpu_percent_before = process.cpu_percent(interval=1.0)
-
-        for receipt in performance_test_receipts[:50]:
-            mock_vllm_client.generate.return_value = receipt["expected"]
-            parser.extract_fields(receipt["text"])
-
-        cpu_percent_after = process.cpu_percent(interval=1.0)
-        cpu_increase = cpu_percent_after - cpu_percent_before
+        samples = []
+        stop = threading.Event()
+
+        # Sample CPU usage every 50ms while the workload runs
+        def sampler():
+            while not stop.wait(0.05):
+                samples.append(process.cpu_percent(interval=None))
+
+        process.cpu_percent(interval=None)  # Prime the baseline for interval=None
+        thread = threading.Thread(target=sampler, daemon=True)
+        thread.start()
+
+        mock_vllm_client.generate.side_effect = [r["expected"] for r in performance_test_receipts[:50]]
+        try:
+            for receipt in performance_test_receipts[:50]:
+                ai_parser.extract_fields(receipt["text"])
+        finally:
+            stop.set()
+            thread.join()
+
+        # Skip warmup samples unless the run was too short to have any after them
+        active = samples[5:] or samples or [process.cpu_percent(interval=None)]
+        cpu_usage = statistics.mean(active)
 
         # Should not peg CPU
-        assert cpu_increase < 80, f"Excessive CPU usage: {cpu_increase:.1f}%"
+        assert cpu_usage < 80, f"Excessive CPU usage: {cpu_usage:.1f}%"
 
     @pytest.mark.skip(reason="Waiting for implementation")
     def test_network_efficiency(self, sample_receipt_text):
         """Test network request efficiency"""
-        from src.vllm_client import VLLMClient
-
-        with patch('requests.post') as mock_post:
+        with patch('requests.Session.post') as mock_post:
             mock_post.return_value = Mock(
                 status_code=200,
                 json=lambda: {
@@ -378,68 +356,73 @@ class TestBenchmarkSummary:
     """Generate benchmark summary report"""
 
     @pytest.mark.skip(reason="Waiting for implementation")
-    def test_generate_benchmark_report(self, performance_test_receipts, mock_vllm_client, tmp_path):
+    def test_generate_benchmark_report(self, performance_test_receipts, ai_parser, respond_by_prompt, tmp_path):
         """Generate comprehensive benchmark report"""
-        from src.ai_receipt_parser import AIReceiptParser
-        import json
-
-        parser = AIReceiptParser(vllm_client=mock_vllm_client)
+        num_receipts = 100
+        memory_sample_every = 10
 
         # Collect metrics
         metrics = {
-            "latency": [],
+            "latency": np.empty(num_receipts, dtype=np.float64),
             "throughput": None,
-            "memory_usage": [],
+            "memory_usage": np.empty(-(-num_receipts // memory_sample_every), dtype=np.float64),
             "success_rate": 0
         }
 
         process = psutil.Process(os.getpid())
         start_memory = process.memory_info().rss / 1024 / 1024
 
-        start_time = time.time()
+        start_time = time.perf_counter()
         successful = 0
+        timed = 0
+        respond_by_prompt(performance_test_receipts[:num_receipts])
 
-        for receipt in performance_test_receipts[:100]:
-            mock_vllm_client.generate.return_value = receipt["expected"]
-
-            extract_start = time.time()
+        for i, receipt in enumerate(performance_test_receipts[:num_receipts]):
+            extract_start = time.perf_counter()
             try:
-                result = parser.extract_fields(receipt["text"])
-                latency = time.time() - extract_start
-                metrics["latency"].append(latency)
+                result = ai_parser.extract_fields(receipt["text"])
+                metrics["latency"][timed] = time.perf_counter() - extract_start
+                timed += 1
                 if "total" in result:
                     successful += 1
             except Exception:
                 pass
 
-            current_memory = process.memory_info().rss / 1024 / 1024
-            metrics["memory_usage"].append(current_memory - start_memory)
+            # Sample RSS periodically; each read is a /proc syscall
+            if i % memory_sample_every == 0:
+                current_memory = process.memory_info().rss / 1024 / 1024
+                metrics["memory_usage"][i // memory_sample_every] = current_memory - start_memory
 
-        duration = time.time() - start_time
-        metrics["throughput"] = 100 / duration
-        metrics["success_rate"] = successful / 100
+        duration = time.perf_counter() - start_time
+        metrics["throughput"] = num_receipts / duration
+        metrics["success_rate"] = successful / num_receipts
+        latencies = metrics["latency"][:timed]
+        # One selection pass (np.partition) for all three percentiles
+        p50, p95, p99 = np.percentile(latencies, [50, 95, 99])
 
         # Calculate statistics
         report = {
-            "total_receipts": 100,
+            "total_receipts": num_receipts,
             "duration_seconds": duration,
             "throughput_per_second": metrics["throughput"],
             "success_rate": metrics["success_rate"],
             "latency": {
-                "avg": sum(metrics["latency"]) / len(metrics["latency"]),
-                "min": min(metrics["latency"]),
-                "max": max(metrics["latency"]),
-                "p95": sorted(metrics["latency"])[int(len(metrics["latency"]) * 0.95)]
+                "avg": float(latencies.mean()),
+                "min": float(latencies.min()),
+                "max": float(latencies.max()),
+                "p50": float(p50),
+                "p95": float(p95),
+                "p99": float(p99)
             },
             "memory": {
-                "avg_mb": sum(metrics["memory_usage"]) / len(metrics["memory_usage"]),
-                "max_mb": max(metrics["memory_usage"])
+                "avg_mb": float(metrics["memory_usage"].mean()),
+                "max_mb": float(metrics["memory_usage"].max())
             }
         }
 
         # Save report
         report_file = tmp_path / "benchmark_report.json"
-        report_file.write_text(json.dumps(report, indent=2))
+        report_file.write_bytes(orjson.dumps(report, option=orjson.OPT_INDENT_2))
 
         # Assertions
         assert report["throughput_per_second"] >= 1.0
@@ -0,0 +1,152 @@
+"""
+Tests for the shared test-data and grading helpers in tests/test_utils.py
+"""
+from datetime import datetime
+
+import numpy as np
+import pytest
+
+import tests.test_utils as test_utils
+from tests.test_utils import (
+    _is_iso_date,
+    calculate_extraction_accuracy,
+    corrupt_receipt_text,
+    generate_batch_receipts,
+    is_receipt_valid,
+    validate_receipt_fields,
+)
+
+
+_VALID = {'vendor': 'Whole Foods', 'date': '2024-01-15', 'total': 125.50}
+
+
+class _InsertOnlyRNG:
+    """Wraps a Generator so corrupt_receipt_text only draws the insert corruption type"""
+
+    def __init__(self, rng: np.random.Generator):
+        self._rng = rng
+
+    def integers(self, low, high, size):
+        if high == 3:  # delete, replace, insert
+            return np.full(size, 2)
+        return self._rng.integers(low, high, size=size)
+
+
+# ============================================================================
+# Generator Tests
+# ============================================================================
+
+class TestReceiptGeneration:
+    """Test receipt generators and text corruption"""
+
+    def test_batch_receipts_in_worker_processes(self):
+        """Test worker processes each draw their own receipts"""
+        receipts = generate_batch_receipts(4, max_workers=2)
+
+        assert len(receipts) == 4
+        assert len({receipt['text'] for receipt in receipts}) == 4
+
+    @pytest.mark.parametrize("rate", [0.0, 0.1, 1.0])
+    def test_corrupt_empty_text(self, rate):
+        """Test corrupting empty text returns empty text"""
+        assert corrupt_receipt_text("", corruption_rate=rate) == ""
+
+    def test_corrupt_insert_only_length(self, monkeypatch):
+        """Test every insert corruption adds exactly one character"""
+        monkeypatch.setattr(test_utils, "_RNG", _InsertOnlyRNG(np.random.default_rng(0)))
+        text = "WHOLE FOODS MARKET\nTotal: $125.50"
+
+        corrupted = corrupt_receipt_text(text, corruption_rate=0.5)
+
+        assert len(corrupted) == len(text) + int(len(text) * 0.5)
+        # Inserts never drop or reorder the original characters
+        remaining = iter(corrupted)
+        assert all(char in remaining for char in text)
+
+
+# ============================================================================
+# Validation Tests
+# ============================================================================
+
+class TestReceiptValidation:
+    """Test receipt field validation helpers"""
+
+    @pytest.mark.parametrize("value", [
+        '2024-01-15', '2024-1-5', '2024-03- 5', '2024-02-29',
+        '2023-02-29', '2024-13-01', '2024-00-10', '2024-01-00', '2024-01-32',
+        '2024-03- 10', '2024-03-  5', '2024- 3-05', ' 2024-01-15', '2024-01-15 ',
+        '24-01-15', '01/15/2024', '2024/01/15', '',
+    ])
+    def test_is_iso_date_matches_strptime(self, value):
+        """Test the regex date check accepts exactly what strptime does"""
+        try:
+            datetime.strptime(value, '%Y-%m-%d')
+            expected = True
+        except ValueError:
+            expected = False
+
+        assert _is_iso_date(value) is expected
+
+    @pytest.mark.parametrize("fields", [
+        _VALID,
+        {**_VALID, 'confidence': {'vendor': 0.9, 'total': 1.0}},
+        {**_VALID, 'total': 0},
+        {**_VALID, 'total': -5.0, 'is_refund': True},
+        {'date': '2024-01-15', 'total': 125.50},
+        {**_VALID, 'vendor': ''},
+        {**_VALID, 'vendor': None},
+        {**_VALID, 'date': None},
+        {**_VALID, 'total': None},
+        {**_VALID, 'total': '125.50'},
+        {**_VALID, 'total': -5.0},
+        {**_VALID, 'total': -5.0, 'is_refund': False},
+        {**_VALID, 'date': '01/15/2024'},
+        {**_VALID, 'date': '2024-02-30'},
+        {**_VALID, 'confidence': [0.9]},
+        {**_VALID, 'confidence': {'vendor': 1.5}},
+        {**_VALID, 'confidence': {'vendor': -0.1}},
+        {},
+    ])
+    def test_matches_validate_receipt_fields(self, fields):
+        """Test the early-exit check is valid exactly when no errors are reported"""
+        assert is_receipt_valid(fields) == (not validate_receipt_fields(fields))
+
+
+# ============================================================================
+# Grading Tests
+# ============================================================================
+
+class TestExtractionAccuracy:
+    """Test calculate_extraction_accuracy scoring"""
+
+    def test_perfect_match(self):
+        """Test a perfect extraction scores 1.0 overall"""
+        fields = {'vendor': 'Whole Foods', 'date': '2024-01-15', 'total': 125.50}
+
+        metrics = calculate_extraction_accuracy(dict(fields), fields)
+
+        assert metrics == {
+            'vendor_match': 1.0,
+            'date_match': 1.0,
+            'total_accuracy': 1.0,
+            'overall_score': 1.0,
+        }
+
+    def test_partial_match(self):
+        """Test overall_score is the mean of the three metrics"""
+        extracted = {'vendor': 'WHOLE FOODS MARKET', 'date': '2024-01-16', 'total': 90.0}
+        expected = {'vendor': 'Whole Foods', 'date': '2024-01-15', 'total': 100.0}
+
+        metrics = calculate_extraction_accuracy(extracted, expected)
+
+        assert metrics['vendor_match'] == 1.0
+        assert metrics['date_match'] == 0.0
+        assert metrics['total_accuracy'] == pytest.approx(0.9)
+        assert metrics['overall_score'] == pytest.approx((1.0 + 0.0 + 0.9) / 3)
+
+    def test_missing_total_against_zero_expected(self):
+        """Test an unextracted total scores 0.0 when nothing was expected"""
+        metrics = calculate_extraction_accuracy({'total': None}, {'total': 0})
+
+        assert metrics['total_accuracy'] == 0.0
+        assert metrics['overall_score'] == 0.0
@@ -72,7 +72,7 @@ class TestVLLMClientRetry:
         """Test client retries on timeout"""
         from src.vllm_client import VLLMClient
 
-        with patch('requests.post') as mock_post:
+        with patch('requests.Session.post') as mock_post:
             # First two calls timeout, third succeeds
             mock_post.side_effect = [
                 TimeoutError(),
@@ -90,7 +90,7 @@ class TestVLLMClientRetry:
         """Test raises error when max retries exceeded"""
         from src.vllm_client import VLLMClient, VLLMConnectionError
 
-        with patch('requests.post') as mock_post:
+        with patch('requests.Session.post') as mock_post:
             mock_post.side_effect = TimeoutError()
 
             client = VLLMClient(max_retries=3)
@@ -105,7 +105,7 @@ class TestVLLMClientRetry:
         """Test exponential backoff between retries"""
         from src.vllm_client import VLLMClient
 
-        with patch('requests.post') as mock_post:
+        with patch('requests.Session.post') as mock_post:
             with patch('time.sleep') as mock_sleep:
                 mock_post.side_effect = [
                     TimeoutError(),
@@ -279,7 +279,7 @@ class TestErrorHandling:
 
         client = VLLMClient(timeout=5)
 
-        with patch('requests.post') as mock_post:
+        with patch('requests.Session.post') as mock_post:
             mock_post.return_value = Mock(
                 status_code=200,
                 json=lambda: {"choices": [{"text": "{}"}]}